@@ -6,11 +6,294 @@ Module for generating zxy tiles
    :synopsis: Module for generating zxy tiles
 """
 
+import itertools
 import math
-from turfpy.transformation import intersect
-from geojson import Feature
-from joblib import Parallel, delayed
-import joblib
+
+# Web Mercator constants: earth radius, half the projected world width in
+# meters and the meters per pixel of a 256px tile at zoom 0.
+_R = 6378137.0
+_HALF = math.pi * _R
+_RES0 = _HALF / 128.0
+_RAD2DEG = 180.0 / math.pi
+_HALF_PI = math.pi / 2.0
+
+def _pixels_to_meters(z:int, x:int, y:int):
+    """
+    Convert pixels to meters based off of zoom level
+
+    :param z: z value for tile
+    :param x: x value in pixels
+    :param y: y value in pixels
+    :type z: int
+    :type x: int
+    :type y: int
+    :return:
+        A request response tuple
+
+    """
+    res = _RES0 / (1 << z)
+    return (x * res - _HALF, _HALF - y * res)
+
+def _meters_to_lat_lng(mx:float, my:float):
+    """
+    Convert a coordinate pair in meters to lat/lng coordinates
+
+    :param mx: x coordinate in meters
+    :param my: y coordinate in meters
+    :type mx: float
+    :type my: float
+    :return:
+        A request response tuple
+
+    """
+    lng = (mx / _HALF) * 180.0
+
+    lat = (my / _HALF) * 180.0
+    lat = _RAD2DEG * (2 * math.atan(math.exp(lat * math.pi / 180.0)) - _HALF_PI)
+
+    return (lng, lat)
+
+def _tile_bounds(z:int, x:int, y:int):
+    """
+    Generate tile bounds in meters from z, x, y location without validating the tile.
+
+    :param z: z value for tile
+    :param x: x value for tile
+    :param y: y value for tile
+    :type z: int
+    :type x: int
+    :type y: int
+    :return:
+        A request response tuple
+
+    """
+    mins = _pixels_to_meters(z, x*256, (y+1)*256)
+    maxs = _pixels_to_meters(z, (x+1)*256, y*256)
+
+    return (mins, maxs)
+
+def _bounds_from_tile(z:int, x:int, y:int):
+    """
+    Convert a z,x,y tile into geographical bounds without validating the tile.
+
+    :param z: z value for tile
+    :param x: x value for tile
+    :param y: y value for tile
+    :type z: int
+    :type x: int
+    :type y: int
+    :return:
+        A request response tuple
+
+    """
+    mins, maxs = _tile_bounds(z, x, y)
+    mins_x, mins_y = _meters_to_lat_lng(*mins)
+    maxs_x, maxs_y = _meters_to_lat_lng(*maxs)
+
+    return (mins_x, mins_y, maxs_x, maxs_y)
+
+def _bounds_overlap(tile_bounds:list, overlap_bounds:list):
+    """
+    Validate if tile_bounds is within bounds of overlap_bounds.
+
+    :param tile_bounds: Bounds for tile
+    :param overlap_bounds: Bounds for overall class
+    :type tile_bounds: list
+    :type overlap_bounds: list
+    :return:
+        A request response boolean
+
+    """
+    # Longitude first: most rejected tiles are separated along it.
+    if tile_bounds[2] < overlap_bounds[0]:
+        return False
+    if tile_bounds[0] > overlap_bounds[2]:
+        return False
+    if tile_bounds[3] < overlap_bounds[1]:
+        return False
+    if tile_bounds[1] > overlap_bounds[3]:
+        return False
+    return True
+
+def _tile_size(z:int):
+    """
+    Get the width of a tile in meters at the given zoom level.
+
+    :param z: z value for tile
+    :type z: int
+    :return:
+        A request response float
+
+    """
+    return _RES0 * 256 / (1 << z)
+
+def _tile_overlaps_bounds(tile_size:float, x:int, y:int, bminx:float, bminy:float, bmaxx:float, bmaxy:float):
+    """
+    Validate if an x,y tile overlaps the given bounding box.
+
+    Computes each tile edge inline and returns as soon as one axis is
+    found to be separated, so most rejected tiles skip the latitude math.
+    The zoom level is given as its tile size from _tile_size so callers
+    testing many tiles at one zoom level compute it once.
+
+    :param tile_size: Width of a tile in meters
+    :param x: x value for tile
+    :param y: y value for tile
+    :param bminx: Minimum x of the bounding box
+    :param bminy: Minimum y of the bounding box
+    :param bmaxx: Maximum x of the bounding box
+    :param bmaxy: Maximum y of the bounding box
+    :type tile_size: float
+    :type x: int
+    :type y: int
+    :type bminx: float
+    :type bminy: float
+    :type bmaxx: float
+    :type bmaxy: float
+    :return:
+        A request response boolean
+
+    """
+    if ((x * tile_size - _HALF) / _HALF) * 180.0 > bmaxx:
+        return False
+    if (((x+1) * tile_size - _HALF) / _HALF) * 180.0 < bminx:
+        return False
+    lat = ((_HALF - (y+1) * tile_size) / _HALF) * 180.0
+    if _RAD2DEG * (2 * math.atan(math.exp(lat * math.pi / 180.0)) - _HALF_PI) > bmaxy:
+        return False
+    lat = ((_HALF - y * tile_size) / _HALF) * 180.0
+    if _RAD2DEG * (2 * math.atan(math.exp(lat * math.pi / 180.0)) - _HALF_PI) < bminy:
+        return False
+    return True
+
+def _lng_to_unit(lng:float):
+    """
+    Project a longitude onto the tile grid as a fraction of the world width.
+
+    :param lng: Longitude in degrees
+    :type lng: float
+    :return:
+        A request response float
+
+    """
+    return (lng + 180.0) / 360.0
+
+def _lat_to_unit(lat:float):
+    """
+    Project a latitude onto the tile grid as a fraction of the world height.
+
+    :param lat: Latitude in degrees
+    :type lat: float
+    :return:
+        A request response float
+
+    """
+    lat_rad = math.radians(lat)
+    return (1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0
+
+def _unit_to_tile(unit:float, size:int):
+    """
+    Convert a grid fraction into the index of the tile containing it.
+
+    Fractions outside the grid, such as latitudes beyond the Web Mercator
+    limit, are clamped to the first or last tile.
+
+    :param unit: Fraction of the world from _lng_to_unit or _lat_to_unit
+    :param size: Number of tiles along the axis
+    :type unit: float
+    :type size: int
+    :return:
+        A request response int
+
+    """
+    return min(max(math.floor(unit * size), 0), size - 1)
+
+def _overlap_range(overlaps, start:int, stop:int, size:int):
+    """
+    Adjust an estimated span of tile indices to exactly those that overlap.
+
+    The closed form estimates from _unit_to_tile can be off by one where a
+    bound falls on a tile edge. Tiles along an axis are monotonic, so the
+    overlapping tiles are contiguous and walking each end of the span a
+    step or two makes it agree with overlaps.
+
+    :param overlaps: Callable returning if the tile at an index overlaps
+    :param start: Estimated first overlapping index
+    :param stop: Estimated last overlapping index
+    :param size: Number of tiles along the axis
+    :type overlaps: callable
+    :type start: int
+    :type stop: int
+    :type size: int
+    :return:
+        A request response range
+
+    """
+    while start > 0 and overlaps(start - 1):
+        start -= 1
+    while stop < size - 1 and overlaps(stop + 1):
+        stop += 1
+    while start <= stop and not overlaps(start):
+        start += 1
+    while stop >= start and not overlaps(stop):
+        stop -= 1
+    return range(start, stop + 1)
+
+def _validate_tile(z:int, x:int, y:int, bounds:list):
+    """
+    Validate if a valid z,x,y tile is within the given bounding box.
+
+    This does not depend on a GenerateTiles instance, so it can be handed
+    to a process pool without pickling one per task.
+
+    :param z: z value for tile
+    :param x: x value for tile
+    :param y: y value for tile
+    :param bounds: The bounding box to validate against.
+    :type z: int
+    :type x: int
+    :type y: int
+    :type bounds: list
+    :return:
+        A request response list
+
+    """
+    if _tile_overlaps_bounds(_tile_size(z), x, y, bounds[0], bounds[1], bounds[2], bounds[3]):
+        return [z, x, y]
+    return []
+
+class TileIterator():
+    """
+    This class provides a lazy, re-iterable view of the tiles in a grid rectangle
+    """
+
+    def __init__(self, z:int, columns:range, rows:range):
+        """
+        Init method
+
+        :param z: z value for the tiles.
+        :param columns: The x values of the tiles.
+        :param rows: The y values of the tiles.
+        :type z: int
+        :type columns: range
+        :type rows: range
+
+        """
+
+        self.z = z
+        self.columns = columns
+        self.rows = rows
+
+    def __iter__(self):
+        z = self.z
+        for x, y in itertools.product(self.columns, self.rows):
+            yield [z, x, y]
+
+    def __len__(self):
+        return len(self.columns) * len(self.rows)
+
+    def __repr__(self):
+        return f"TileIterator(z={self.z}, columns={self.columns!r}, rows={self.rows!r})"
 
 class GenerateTiles():
     """
@@ -74,14 +357,10 @@ class GenerateTiles():
         :type x: int
         :type y: int
         :return:
-            A request response list
+            A request response tuple
 
         """
-        res = (2 * math.pi * 6378137 / 256) / (math.pow(2, z))
-        mx = x * res - (2 * math.pi * 6378137 / 2.0)
-        my = y * res - (2 * math.pi * 6378137 / 2.0)
-        my = -my
-        return [mx, my]
+        return _pixels_to_meters(z, x, y)
 
     def tile_is_valid(self, z:int, x:int, y:int):
         """
@@ -97,7 +376,7 @@ class GenerateTiles():
             A request boolean
 
         """
-        size = 2 ** z
+        size = 1 << z
         if x >= size:
             return False
         if y >= size:
@@ -117,16 +396,13 @@ class GenerateTiles():
         :type x: int
         :type y: int
         :return:
-            A request response list
+            A request response tuple
         :raise:
             ValueError
 
         """
         if self.tile_is_valid(z, x, y):
-            mins = self.pixels_to_meters(z, x*256, (y+1)*256)
-            maxs = self.pixels_to_meters(z, (x+1)*256, y*256)
-
-            return [mins, maxs]
+            return _tile_bounds(z, x, y)
 
         raise ValueError("Invalid tile")
 
@@ -137,16 +413,10 @@ class GenerateTiles():
         :param coord: Cordinates pair in meters 
         :type coord: list
         :return:
-            A request response list
+            A request response tuple
             
         """
-        lng = (coord[0] / (2 * math.pi * 6378137 / 2.0)) * 180.0
-
-        lat = (coord[1] / (2 * math.pi * 6378137 / 2.0)) * 180.0
-        lat = 180 / math.pi * \
-            (2 * math.atan(math.exp(lat * math.pi / 180.0)) - math.pi / 2.0)
-
-        return [lng, lat]
+        return _meters_to_lat_lng(coord[0], coord[1])
 
     def bounds_from_tile(self, z:int, x:int, y:int):
         """
@@ -159,33 +429,28 @@ class GenerateTiles():
         :type x: int
         :type y: int
         :return:
-            A request response list
+            A request response tuple
+        :raise:
+            ValueError
             
         """
-        bounds = self.tile_bounds(z, x, y)
-        mins = self.meters_to_lat_lng(bounds[0])
-        maxs = self.meters_to_lat_lng(bounds[1])
-
-        bounds = [mins[0], mins[1], maxs[0], maxs[1]]
+        if self.tile_is_valid(z, x, y):
+            return _bounds_from_tile(z, x, y)
 
-        return bounds
+        raise ValueError("Invalid tile")
     
     def zoom_generator(self, z:int):
         """
-        Generate a list of possible tiles from given zoom level.
+        Yield every possible tile from given zoom level.
         
         :param z: z value for tile
         :type z: int
         :return:
-            A request response list
+            A request response generator
             
         """
-        tiles = []
-        size = 2 ** z
-        for x in range(size):
-            for y in range(size):
-                tiles.append([z, x, y])
-        return tiles
+        size = 1 << z
+        yield from TileIterator(z, range(size), range(size))
     
     def tile_bounds_within_overall_bounds(self, tile_bounds:list, overlap_bounds:list):
         """
@@ -199,58 +464,7 @@ class GenerateTiles():
             A request response boolean
             
         """
-        a = Feature(geometry={"coordinates": [
-            [
-                [
-                    tile_bounds[0],
-                    tile_bounds[1]
-                ],
-                [
-                    tile_bounds[2],
-                    tile_bounds[1]
-                ],
-                [
-                    tile_bounds[2],
-                    tile_bounds[3]
-                ],
-                [
-                    tile_bounds[0],
-                    tile_bounds[3]
-                ],
-                [
-                    tile_bounds[0],
-                    tile_bounds[1]
-                ]
-            ]
-        ], "type": "Polygon"})
-        b = Feature(geometry={"coordinates": [
-            [
-                [
-                    overlap_bounds[0],
-                    overlap_bounds[1]
-                ],
-                [
-                    overlap_bounds[2],
-                    overlap_bounds[1]
-                ],
-                [
-                    overlap_bounds[2],
-                    overlap_bounds[3]
-                ],
-                [
-                    overlap_bounds[0],
-                    overlap_bounds[3]
-                ],
-                [
-                    overlap_bounds[0],
-                    overlap_bounds[1]
-                ]
-            ]
-        ], "type": "Polygon"})
-        if intersect([a, b]):
-            return True
-        else:
-            return False
+        return _bounds_overlap(tile_bounds, overlap_bounds)
     
     def validate_tile(self, tile:list):
         """
@@ -258,28 +472,56 @@ class GenerateTiles():
         
         :return:
             A request response list
+        :raise:
+            ValueError
             
         """
-        tile_bounds = self.bounds_from_tile(tile[0], tile[1], tile[2])
-        if self.tile_bounds_within_overall_bounds(tile_bounds, self.bounds):
+        if not self.tile_is_valid(tile[0], tile[1], tile[2]):
+            raise ValueError("Invalid tile")
+        if _validate_tile(tile[0], tile[1], tile[2], self.bounds):
             return tile
         else:
             return []
 
     def generate(self):
         """
-        Generate a list of tiles at each given zoom level with the given bounds.
+        Generate the tiles at each given zoom level with the given bounds.
+
+        Each zoom level maps to a TileIterator, which yields its tiles on
+        demand. Call list() on it to get the tiles as a list.
         
         :return:
             A request response object
             
         """
         overall_tiles = {}
+        bounded = self.bounds != [-180, -90, 180, 90]
+        if bounded:
+            # The inverse projection of the bounds does not depend on the
+            # zoom level, so only scaling to each grid is left in the loop.
+            minx, miny, maxx, maxy = self.bounds
+            west, east = _lng_to_unit(minx), _lng_to_unit(maxx)
+            north, south = _lat_to_unit(maxy), _lat_to_unit(miny)
+            # Local aliases for the calls made while walking each edge.
+            overlaps = _tile_overlaps_bounds
+            to_tile = _unit_to_tile
         for z in range(self.min_zoom, self.max_zoom+1):
-            tiles = self.zoom_generator(z)
-            if self.bounds != [-180, -90, 180, 90]:
-                filtered_tiles = Parallel(n_jobs=joblib.cpu_count())(delayed(self.validate_tile)(tile) for tile in tiles)
-                overall_tiles[z] = list(filter(lambda x: len(x) > 0, filtered_tiles))
+            size = 1 << z
+            if bounded:
+                # A tile overlaps the bounds only when its column overlaps in
+                # longitude and its row overlaps in latitude. Both are
+                # contiguous runs, so locate their ends from the bounds
+                # instead of testing every column and row.
+                tile_size = _tile_size(z)
+                columns = _overlap_range(
+                    lambda x: overlaps(tile_size, x, 0, minx, -90, maxx, 90),
+                    to_tile(west, size), to_tile(east, size), size
+                )
+                rows = _overlap_range(
+                    lambda y: overlaps(tile_size, 0, y, -180, miny, 180, maxy),
+                    to_tile(north, size), to_tile(south, size), size
+                )
+                overall_tiles[z] = TileIterator(z, columns, rows)
             else:
-                overall_tiles[z] = tiles
+                overall_tiles[z] = TileIterator(z, range(size), range(size))
         return overall_tiles
@@ -1,6 +1,6 @@
-from tileGenerator import generator
+from VectorTileGenerator import generator
 
 tileGeneration = generator.GenerateTiles(1, 5, [-118, 34, -84, 50])
 
 # Demo of generating tiles
-print(tileGeneration.generate())
\ No newline at end of file
+print({z: list(tiles) for z, tiles in tileGeneration.generate().items()})